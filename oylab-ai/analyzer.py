@@ -1,37 +1,73 @@
-import io, os, re, json, requests
+import io, os, requests
+from collections import defaultdict
+from concurrent.futures import Executor
 from typing import Dict, List, BinaryIO
 
+import ahocorasick
+import orjson
 import pdfplumber
+import pypdf
 from pptx import Presentation
+from requests.adapters import HTTPAdapter
+
+# Only this much deck text is scored; keyword signal saturates well before it.
+MAX_TEXT_CHARS = 60000
 
 # ---------- Weights ----------
-WEIGHTS = {
-    "team": 0.25,
-    "market": 0.20,
-    "product": 0.30,
-    "finance": 0.20,
-    "design": 0.05,
-}
+# Percent weights (sum to 100), in integer math so the total is exact.
+def _weighted(b: Dict[str, int]) -> int:
+    return (25 * b["team"] + 20 * b["market"] + 30 * b["product"]
+            + 20 * b["finance"] + 5 * b["design"]) // 100
 
 # ---------- Keyword sets ----------
-TEAM = [r"\bteam\b", r"\bfounder\b", r"\bco[- ]?founder\b", r"\bcto\b", r"\bceo\b",
-        r"\bexperience\b", r"\baward\b", r"\badvisor\b", r"\bmentor\b"]
-MARKET = [r"\bmarket\b", r"\btam\b", r"\bsam\b", r"\bsom\b", r"\busers?\b",
-          r"\bgrowth\b", r"\bcustomer\b", r"\bsegment\b", r"\btraction\b",
-          r"\bcampaign\b", r"\binfluencer\b", r"\bpilot\b"]
-PRODUCT = [r"\bproduct\b", r"\bproblem\b", r"\bsolution\b", r"\bmvp\b",
-           r"\bprototype\b", r"\btech(nology)?\b", r"\barchitecture\b",
-           r"\balgorithm\b", r"\broadmap\b", r"\bapi\b", r"\bmobile app\b",
-           r"\bbackend\b", r"\bfrontend\b"]
-FINANCE = [r"\brevenue\b", r"\bpricing\b", r"\bcost\b", r"\bunit\b",
-           r"\bcogs\b", r"\bcac\b", r"\bltv\b", r"\bmargin\b",
-           r"\bmoneti[sz]ation\b", r"\bgtm\b"]
-DESIGN = [r"\bdesign\b", r"\bui\b", r"\bux\b", r"\bmockups?\b", r"\bwireframes?\b",
-          r"\bfigma\b", r"\bprototype\b", r"\bvisuals?\b", r"\btypography\b",
-          r"\blayout\b", r"\bstyle\b", r"\bbrand(ing)?\b"]
+# One entry per scoring signal; "|" separates the literal spellings of it.
+TEAM = ["team", "founder", "cofounder|co-founder|co founder", "cto", "ceo",
+        "experience", "award", "advisor", "mentor"]
+MARKET = ["market", "tam", "sam", "som", "user|users",
+          "growth", "customer", "segment", "traction",
+          "campaign", "influencer", "pilot"]
+PRODUCT = ["product", "problem", "solution", "mvp",
+           "prototype", "tech|technology", "architecture",
+           "algorithm", "roadmap", "api", "mobile app",
+           "backend", "frontend"]
+FINANCE = ["revenue", "pricing", "cost", "unit",
+           "cogs", "cac", "ltv", "margin",
+           "monetisation|monetization", "gtm"]
+DESIGN = ["design", "ui", "ux", "mockup|mockups", "wireframe|wireframes",
+          "figma", "prototype", "visual|visuals", "typography",
+          "layout", "style", "brand|branding"]
+
+CATEGORIES = {
+    "team": TEAM,
+    "market": MARKET,
+    "product": PRODUCT,
+    "finance": FINANCE,
+    "design": DESIGN,
+}
+
+def _build_automaton() -> ahocorasick.Automaton:
+    hits = defaultdict(list)  # literal -> [(category, keyword), ...]
+    for cat, keywords in CATEGORIES.items():
+        for kw in keywords:
+            for lit in kw.split("|"):
+                hits[lit].append((cat, kw))
+    automaton = ahocorasick.Automaton()
+    for lit, keys in hits.items():
+        automaton.add_word(lit, (len(lit), tuple(keys)))
+    automaton.make_automaton()
+    return automaton
+
+_AUTOMATON = _build_automaton()
 
 # ---------- Extraction ----------
-def _extract_pdf(buf: BinaryIO) -> str:
+def _extract_pdf(buf: BinaryIO, fast: bool = False) -> str:
+    # pypdf skips pdfplumber's layout work but glues/splits some words
+    # ("bac kendfrontend"), which breaks keyword matching; only the LLM gets it
+    if fast:
+        try:
+            return "\n".join(p.extract_text() or "" for p in pypdf.PdfReader(buf).pages)
+        except Exception:
+            buf.seek(0)
     text = []
     with pdfplumber.open(buf) as pdf:
         for p in pdf.pages:
@@ -41,123 +77,141 @@ def _extract_pdf(buf: BinaryIO) -> str:
 
 def _extract_ppt(buf: BinaryIO) -> str:
     prs = Presentation(buf)
-    chunks = []
-    for slide in prs.slides:
-        for shape in slide.shapes:
-            if hasattr(shape, "text"):
-                chunks.append(shape.text)
-    return "\n".join(chunks)
-
-def _extract_any(file_storage) -> str:
-    name = (getattr(file_storage, "filename", "") or "").lower()
-    raw = file_storage.read()
-    file_storage.stream.seek(0)
-    buf = io.BytesIO(raw)
+    return "\n".join(shape.text for slide in prs.slides
+                     for shape in slide.shapes if hasattr(shape, "text"))
+
+def _extract_any(buf: BinaryIO, filename: str, fast_pdf: bool = False) -> str:
+    name = (filename or "").lower()
+    buf.seek(0)
+    head = buf.read(4)
+    buf.seek(0)
+    # content wins over the extension, so misnamed files are parsed only once
+    if head == b"%PDF":
+        return _extract_pdf(buf, fast_pdf)
+    if head == b"PK\x03\x04":  # pptx is a zip
+        return _extract_ppt(buf)
     if name.endswith(".pdf"):
-        return _extract_pdf(buf)
+        return _extract_pdf(buf, fast_pdf)
     if name.endswith(".pptx") or name.endswith(".ppt"):
         return _extract_ppt(buf)
     try:
-        buf.seek(0);  return _extract_pdf(buf)
+        buf.seek(0);  return _extract_pdf(buf, fast_pdf)
     except Exception:
         buf.seek(0);  return _extract_ppt(buf)
 
 # ---------- Heuristic ----------
-def _score(text: str, patterns: List[str]) -> int:
-    t = text.lower()
+def _is_word_char(c: str) -> bool:
+    # same notion of "word" as regex \w, so hits behave like \bkeyword\b
+    return c.isalnum() or c == "_"
+
+def _keyword_hits(t: str) -> Dict[tuple, int]:
+    freq: Dict[tuple, int] = defaultdict(int)
+    n = len(t)
+    for end, (size, keys) in _AUTOMATON.iter(t):
+        start = end - size + 1
+        if start > 0 and _is_word_char(t[start - 1]):
+            continue
+        if end + 1 < n and _is_word_char(t[end + 1]):
+            continue
+        for key in keys:
+            freq[key] += 1
+    return freq
+
+def _score(freq: Dict[tuple, int], category: str, keywords: List[str]) -> int:
     found = 0
-    for p in patterns:
-        m = re.findall(p, t)
+    for kw in keywords:
+        m = freq[(category, kw)]
         if m:
             found += 1
-            if len(m) > 2:  # бонус за частоту
+            if m > 2:  # бонус за частоту
                 found += 1
-    maxp = max(1, len(patterns) + 2)
+    maxp = max(1, len(keywords) + 2)
     return int((found / maxp) * 100)
 
+# (category, threshold, advice) — advice is given when the score is below threshold
+_RECS = (
+    ("team", 70, "Add a team slide: roles, achievements, why this team wins."),
+    ("market", 70, "Quantify TAM/SAM/SOM and add customer validation/segments."),
+    ("product", 70, "Clarify problem→solution; show MVP screenshots or demo link."),
+    ("finance", 70, "Explain pricing, unit economics (CAC/LTV, margin) and GTM."),
+    ("design", 70, "Improve visuals: consistent UI/UX, Figma mockups, clear layout."),
+)
+
 def _recommend(b: Dict[str, int]) -> List[str]:
-    recs: List[str] = []
-    if b["team"] < 70:
-        recs.append("Add a team slide: roles, achievements, why this team wins.")
-    if b["market"] < 70:
-        recs.append("Quantify TAM/SAM/SOM and add customer validation/segments.")
-    if b["product"] < 70:
-        recs.append("Clarify problem→solution; show MVP screenshots or demo link.")
-    if b["finance"] < 70:
-        recs.append("Explain pricing, unit economics (CAC/LTV, margin) and GTM.")
-    if b["design"] < 70:
-        recs.append("Improve visuals: consistent UI/UX, Figma mockups, clear layout.")
-    if not recs:
-        recs.append("Great fundamentals. Add traction metrics and a clear ‘ask’.")
-    return recs
+    return ([msg for k, thr, msg in _RECS if b[k] < thr]
+            or ["Great fundamentals. Add traction metrics and a clear ‘ask’."])
 
 def _heuristic_breakdown(text: str) -> Dict[str, int]:
-    return {
-        "team": _score(text, TEAM),
-        "market": _score(text, MARKET),
-        "product": _score(text, PRODUCT),
-        "finance": _score(text, FINANCE),
-        "design": _score(text, DESIGN),
-    }
+    freq = _keyword_hits(text[:MAX_TEXT_CHARS].lower())
+    return {cat: _score(freq, cat, kws) for cat, kws in CATEGORIES.items()}
 
 # ---------- OpenRouter LLM ----------
-def _clamp(n: int) -> int:
-    return max(0, min(100, int(n)))
+# keep-alive pool so repeated calls skip the TCP/TLS handshake
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=10))
+
+_OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+_RESPONSE_FORMAT = {"type": "json_object"}
+_SYSTEM_MSG = {"role": "system", "content": (
+    "You are a strict pitch-deck evaluator for high-school startup competitions. "
+    "Score each category from 0 to 100 based on evidence in the text. "
+    "Never guess; if information is missing, give a low score. Output compact JSON only."
+)}
+_USER_PROMPT = (
+    "Return a JSON object with keys: scores, suggestions.\n"
+    "scores = {team:int, market:int, product:int, finance:int, design:int}.\n"
+    "suggestions = array of 3-8 short actionable strings.\n\n"
+)
 
 def _llm_analyze_openrouter(text: str) -> dict:
-    url = "https://openrouter.ai/api/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {os.environ['OPENAI_API_KEY']}",
-        "Content-Type": "application/json"
-    }
-    if len(text) > 60000:
-        text = text[:60000]
+    # key and model are read per call: .env is loaded after this module is imported
+    headers = {"Authorization": f"Bearer {os.environ['OPENAI_API_KEY']}"}
+    text = text[:MAX_TEXT_CHARS]
 
     payload = {
         "model": os.getenv("OPENAI_MODEL", "openai/gpt-4o-mini"),
-        "response_format": {"type": "json_object"},
+        "response_format": _RESPONSE_FORMAT,
         "messages": [
-            {"role": "system", "content": (
-                "You are a strict pitch-deck evaluator for high-school startup competitions. "
-                "Score each category from 0 to 100 based on evidence in the text. "
-                "Never guess; if information is missing, give a low score. Output compact JSON only."
-            )},
-            {"role": "user", "content": (
-                "Return a JSON object with keys: scores, suggestions.\n"
-                "scores = {team:int, market:int, product:int, finance:int, design:int}.\n"
-                "suggestions = array of 3-8 short actionable strings.\n\n"
-                f"<deck>\n{text}\n</deck>"
-            )}
+            _SYSTEM_MSG,
+            {"role": "user", "content": f"{_USER_PROMPT}<deck>\n{text}\n</deck>"},
         ]
     }
 
-    r = requests.post(url, headers=headers, json=payload, timeout=60)
+    r = _SESSION.post(_OPENROUTER_URL, headers=headers, json=payload, timeout=60)
     r.raise_for_status()
-    data = r.json()
+    data = orjson.loads(r.content)
     content = data["choices"][0]["message"]["content"]
-    parsed = json.loads(content)
+    parsed = orjson.loads(content)
 
     scores = parsed.get("scores", {})
-    breakdown = {
-        "team": _clamp(scores.get("team", 0)),
-        "market": _clamp(scores.get("market", 0)),
-        "product": _clamp(scores.get("product", 0)),
-        "finance": _clamp(scores.get("finance", 0)),
-        "design": _clamp(scores.get("design", 0)),
-    }
-    score = int(sum(breakdown[k] * WEIGHTS[k] for k in WEIGHTS))
+    breakdown = {}
+    for k in CATEGORIES:
+        v = scores.get(k, 0)
+        if type(v) is not int:  # JSON ints need no coercion; bool must become 0/1
+            v = int(v)
+        breakdown[k] = max(0, min(100, v))
+    score = _weighted(breakdown)
     return {"score": score, "breakdown": breakdown, "recommendations": parsed.get("suggestions", [])}
 
 # ---------- Orchestrator ----------
-def analyze_pitch(file_storage) -> Dict:
-    text = _extract_any(file_storage)
+# Worker-process entry points: raw bytes because uploads can't be pickled.
+def _extract_text_bytes(data: bytes, filename: str, fast_pdf: bool = False) -> str:
+    return _extract_any(io.BytesIO(data), filename, fast_pdf)
+
+def _heuristic_analyze_bytes(data: bytes, filename: str) -> Dict:
+    # heuristic scores are calibrated on pdfplumber text
+    b = _heuristic_breakdown(_extract_any(io.BytesIO(data), filename))
+    score = _weighted(b)
+    return {"score": score, "breakdown": b, "recommendations": _recommend(b)}
+
+def analyze_pitch(data: bytes, filename: str, pool: Executor) -> Dict:
+    """Parsing and keyword scoring run on `pool`; the LLM request stays in the caller's thread."""
     mode = os.getenv("AI_MODE", "heuristic").lower()
-    try:
-        if mode == "openai" and os.getenv("OPENAI_API_KEY"):
+    if mode == "openai" and os.getenv("OPENAI_API_KEY"):
+        text = pool.submit(_extract_text_bytes, data, filename, True).result()
+        try:
             return _llm_analyze_openrouter(text)
-    except Exception as e:
-        print("LLM failed, fallback to heuristic:", e)
+        except Exception as e:
+            print("LLM failed, fallback to heuristic:", e)
     # fallback
-    b = _heuristic_breakdown(text)
-    score = int(sum(b[k] * WEIGHTS[k] for k in WEIGHTS))
-    return {"score": score, "breakdown": b, "recommendations": _recommend(b)}
+    return pool.submit(_heuristic_analyze_bytes, data, filename).result()
@@ -1,19 +1,41 @@
 import os
+import threading
+import multiprocessing
+import orjson
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from werkzeug.exceptions import RequestEntityTooLarge
 from dotenv import load_dotenv
 
 from analyzer import analyze_pitch
-from schemas import AnalyzeResponse, ApiError, AuthSignup, AuthLogin
-from supabase_client import supabase
+from schemas import AnalyzeResponse, AuthSignup, AuthLogin
+from supabase_client import get_supabase
 
 load_dotenv()
 
 MAX_FILE_MB = int(os.getenv("MAX_FILE_MB", "16"))
 MAX_CONTENT_LENGTH = MAX_FILE_MB * 1024 * 1024
+ANALYZE_WORKERS = int(os.getenv("ANALYZE_WORKERS", str(os.cpu_count() or 1)))
+
+# даты отдаём в default Flask, чтобы формат остался HTTP-date, как раньше
+_ORJSON_OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """jsonify/get_json через orjson; нестандартные типы — как у Flask."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=_ORJSON_OPTS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.config["MAX_CONTENT_LENGTH"] = MAX_CONTENT_LENGTH
 CORS(app, resources={r"/*": {"origins": os.getenv("ALLOWED_ORIGINS", "*").split(",")}})
 
@@ -21,10 +43,36 @@ def ok(data, status=200):
     return jsonify(data), status
 
 
+# -------- Analyze pool --------
+# Разбор PDF/PPT и скоринг — CPU: выносим в процессы, чтобы не держать GIL сервера.
+# Запрос к LLM — сетевое ожидание, он остаётся в потоке запроса (см. analyze_pitch).
+# Пул создаётся при первом запросе (spawn, не fork из многопоточного сервера).
+_analyze_pool = None
+_analyze_pool_lock = threading.Lock()
+
+
+def _get_analyze_pool() -> ProcessPoolExecutor:
+    global _analyze_pool
+    with _analyze_pool_lock:
+        if _analyze_pool is None:
+            _analyze_pool = ProcessPoolExecutor(
+                max_workers=ANALYZE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _analyze_pool
+
+
+def _drop_analyze_pool(broken: ProcessPoolExecutor):
+    """Воркер умер (OOM, падение парсера) — пул больше не годен, следующий запрос соберёт новый."""
+    global _analyze_pool
+    with _analyze_pool_lock:
+        if _analyze_pool is broken:
+            _analyze_pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
 # -------- Errors --------
 @app.errorhandler(RequestEntityTooLarge)
 def too_large(_):
-    return ok(ApiError(error=f"File too large. Max {MAX_FILE_MB}MB").model_dump(), 413)
+    return ok({"error": f"File too large. Max {MAX_FILE_MB}MB"}, 413)
 
 
 # -------- Health --------
@@ -37,25 +85,31 @@ def health():
 @app.post("/analyze")
 def analyze():
     if "file" not in request.files:
-        return ok(ApiError(error="No file field").model_dump(), 400)
+        return ok({"error": "No file field"}, 400)
     f = request.files["file"]
     if not f.filename:
-        return ok(ApiError(error="Empty filename").model_dump(), 400)
+        return ok({"error": "Empty filename"}, 400)
 
     name = f.filename.lower()
     if not (name.endswith(".pdf") or name.endswith(".ppt") or name.endswith(".pptx")):
-        return ok(ApiError(error="Unsupported file type (PDF/PPT/PPTX)").model_dump(), 400)
+        return ok({"error": "Unsupported file type (PDF/PPT/PPTX)"}, 400)
 
+    pool = _get_analyze_pool()
     try:
-        result = analyze_pitch(f)  # dict: score, breakdown, recommendations
+        # dict: score, breakdown, recommendations
+        result = analyze_pitch(f.read(), f.filename, pool)
         _maybe_persist_analysis(request, f.filename, result)
         return ok(AnalyzeResponse(**result).model_dump())
+    except BrokenProcessPool:
+        _drop_analyze_pool(pool)
+        return ok({"error": "Analyzer worker crashed, please retry"}, 503)
     except Exception as ex:
-        return ok(ApiError(error=f"Analyzer error: {ex}").model_dump(), 500)
+        return ok({"error": f"Analyzer error: {ex}"}, 500)
 
 
 def _maybe_persist_analysis(req, filename: str, result: dict):
     """Сохраняем анализ в Supabase, если клиент и таблица настроены."""
+    supabase = get_supabase()
     if not supabase:
         return
     try:
@@ -66,7 +120,7 @@ def _maybe_persist_analysis(req, filename: str, result: dict):
             "file_name": filename,
             "score": result.get("score"),
             "breakdown": result.get("breakdown"),
-            "notes": "\n".join(result.get("recommendations", []))
+            "notes": result.get("recommendations", []),  # jsonb-колонка
         }).execute()
     except Exception:
         pass
@@ -74,6 +128,7 @@ def _maybe_persist_analysis(req, filename: str, result: dict):
 
 def _get_user_id_from_auth(req):
     """Парсим 'Authorization: Bearer <jwt>' и спрашиваем user у Supabase (если доступно)."""
+    supabase = get_supabase()
     if not supabase:
         return None
     try:
@@ -91,6 +146,7 @@ def _get_user_id_from_auth(req):
 # -------- Partners (GET) --------
 @app.get("/partners")
 def partners():
+    supabase = get_supabase()
     if supabase:
         try:
             table = os.getenv("SUPABASE_PARTNERS_TABLE", "partners")
@@ -108,6 +164,7 @@ def partners():
 # -------- Leaderboard (GET) --------
 @app.get("/leaderboard")
 def leaderboard():
+    supabase = get_supabase()
     year  = request.args.get("year", type=int)
     event = request.args.get("event", type=str)
 
@@ -142,19 +199,21 @@ def leaderboard():
 # -------- Auth (signup / login / me) --------
 @app.post("/auth/signup")
 def auth_signup():
+    supabase = get_supabase()
     if not supabase:
-        return ok(ApiError(error="Supabase not configured").model_dump(), 500)
+        return ok({"error": "Supabase not configured"}, 500)
     try:
         payload = AuthSignup(**request.get_json(force=True))
         res = supabase.auth.sign_up({"email": payload.email, "password": payload.password})
         return ok({"user": getattr(res, "user", None) or getattr(res, "user", None)})
     except Exception as e:
-        return ok(ApiError(error=f"signup failed: {e}").model_dump(), 400)
+        return ok({"error": f"signup failed: {e}"}, 400)
 
 @app.post("/auth/login")
 def auth_login():
+    supabase = get_supabase()
     if not supabase:
-        return ok(ApiError(error="Supabase not configured").model_dump(), 500)
+        return ok({"error": "Supabase not configured"}, 500)
     try:
         payload = AuthLogin(**request.get_json(force=True))
         res = supabase.auth.sign_in_with_password({"email": payload.email, "password": payload.password})
@@ -166,17 +225,18 @@ def auth_login():
         data = res.__dict__
         return ok({"data": data})
     except Exception as e:
-        return ok(ApiError(error=f"login failed: {e}").model_dump(), 400)
+        return ok({"error": f"login failed: {e}"}, 400)
 
 @app.get("/auth/me")
 def auth_me():
+    supabase = get_supabase()
     if not supabase:
-        return ok(ApiError(error="Supabase not configured").model_dump(), 500)
+        return ok({"error": "Supabase not configured"}, 500)
     try:
         auth = request.headers.get("Authorization", "")
         parts = auth.split()
         if len(parts) != 2 or parts[0].lower() != "bearer":
-            return ok(ApiError(error="Missing Bearer token").model_dump(), 401)
+            return ok({"error": "Missing Bearer token"}, 401)
         jwt = parts[1]
         user = supabase.auth.get_user(jwt)
         # У разных версий клиента форма ответа отличается — нормализуем
@@ -184,12 +244,13 @@ def auth_me():
             return ok({"user": user.user})
         return ok({"user": user})
     except Exception as e:
-        return ok(ApiError(error=f"me failed: {e}").model_dump(), 400)
+        return ok({"error": f"me failed: {e}"}, 400)
 
 
 # -------- Debug (опционально) --------
 @app.get("/debug-supabase")
 def debug_supabase():
+    supabase = get_supabase()
     if not supabase:
         return ok({"error": "Supabase client not initialized. Check SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY in .env."})
     try:
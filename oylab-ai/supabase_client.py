@@ -1,14 +1,18 @@
 import os
+from functools import lru_cache
 from typing import Optional
 from supabase import create_client, Client
 
-_SUPABASE_URL = os.getenv("SUPABASE_URL")
-_SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
-supabase: Optional[Client] = None
-if _SUPABASE_URL and _SUPABASE_KEY:
+@lru_cache(maxsize=None)
+def get_supabase() -> Optional[Client]:
+    """Клиент создаётся при первом обращении, а не при импорте."""
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not (url and key):
+        return None
     try:
-        supabase = create_client(_SUPABASE_URL, _SUPABASE_KEY)
+        return create_client(url, key)
     except Exception as e:
         print("Supabase init failed:", e)
-        supabase = None
+        return None